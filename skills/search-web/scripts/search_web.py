@@ -1,16 +1,87 @@
 #!/usr/bin/env python3
 import argparse
+import base64
+import concurrent.futures
+import functools
+import gzip
+import hashlib
+import http.client
 import json
 import os
 import re
 import sys
-import urllib.error
+import tempfile
+import threading
+import time
+import urllib.parse
 import urllib.request
+import zlib
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is used otherwise
+    orjson = None
+
 
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-GITHUB_RELEASES_API = "https://api.github.com/repos/openai/codex/releases?per_page=100"
+GITHUB_API_PREFIX = "https://api.github.com/"
+GITHUB_RELEASES_API = GITHUB_API_PREFIX + "repos/openai/codex/releases?per_page=100"
+GITHUB_CACHE_TTL_S = 600
+
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF_S = 0.3
+HTTP_RETRY_MAX_DELAY_S = 30.0
+HTTP_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+HTTP_REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+HTTP_MAX_REDIRECTS = 5
+
+_CODEX_VER_RE = re.compile(r"0\.(\d{2})(?:\.\d+)?")
+_RUST_TAG_RE = re.compile(r"rust-v0\.(\d{2})\.0")
+# Markdown list item: the whole leading "-"/"*" run is stripped (the lookahead
+# stops backtracking into it, so "---" rules don't match), non-empty text captured.
+_BULLET_RE = re.compile(r"^[^\S\n]*[-*]+(?![-*])[^\S\n]*(\S.*?)[^\S\n]*$", re.MULTILINE)
+_TRACKING_PARAM_PREFIXES = ("utm_", "ref=", "fbclid=", "gclid=")
+_COMPLEXITY_MARKERS = [
+    "porówn",
+    "różnic",
+    "wady",
+    "zalety",
+    "dlaczego",
+    "jak zrobić",
+    "krok po kroku",
+    "strategi",
+    "plan",
+    "analiz",
+    "relacj",
+    "histori",
+    "tło",
+    "konsekwenc",
+    "wpływ",
+    "kontrowers",
+    "zależy",
+]
+_COMPLEXITY_RE = re.compile("|".join(map(re.escape, _COMPLEXITY_MARKERS)))
+_DEEP_INTENT_RE = re.compile(r"3 razy|trzy razy|iterac|seria wyszuka|zgłębia|głębok|deep")
+_SIMPLE_INTENT_RE = re.compile(r"proste|szybko|jedno wyszuk|jednoraz|basic")
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _json_loads(raw: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:  # orjson.JSONEncodeError, e.g. integers beyond 64 bits
+            pass
+    return json.dumps(obj, ensure_ascii=False)
 
 
 def _die(message: str, code: int = 2) -> "None":
@@ -18,46 +89,271 @@ def _die(message: str, code: int = 2) -> "None":
     raise SystemExit(code)
 
 
+# Idle keep-alive connections keyed by (scheme, host), so repeated calls to the
+# same API (e.g. the 4 OpenRouter calls in deep mode) reuse TCP + TLS sessions.
+_IDLE_CONNS: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+_IDLE_LOCK = threading.Lock()
+
+
+def _proxy_for(scheme: str, host: str) -> Optional[urllib.parse.SplitResult]:
+    """Returns the HTTP(S)_PROXY to use for this host, honouring NO_PROXY (same rules as urllib)."""
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(host):
+        return None
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    return urllib.parse.urlsplit(proxy)
+
+
+def _proxy_auth_headers(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+    if not proxy.username:
+        return {}
+    creds = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+    return {"Proxy-Authorization": "Basic " + base64.b64encode(creds.encode("utf-8")).decode("ascii")}
+
+
+def _new_conn(
+    scheme: str, host: str, timeout: float, proxy: Optional[urllib.parse.SplitResult]
+) -> http.client.HTTPConnection:
+    if proxy is None:
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, timeout=timeout)
+        return http.client.HTTPConnection(host, timeout=timeout)
+
+    proxy_host = proxy.hostname or ""
+    proxy_port = proxy.port or 80
+    if scheme == "https":
+        # HTTPS goes through a CONNECT tunnel, TLS is still end-to-end with the target.
+        conn = http.client.HTTPSConnection(proxy_host, proxy_port, timeout=timeout)
+        target = urllib.parse.urlsplit(f"https://{host}")
+        conn.set_tunnel(target.hostname or host, target.port or 443, headers=_proxy_auth_headers(proxy))
+        return conn
+    return http.client.HTTPConnection(proxy_host, proxy_port, timeout=timeout)
+
+
+def _http_call_once(
+    method: str,
+    url: str,
+    body: Optional[bytes],
+    headers: Optional[Dict[str, str]],
+    timeout: float,
+) -> Tuple[int, http.client.HTTPMessage, bytes]:
+    headers = {"Accept-Encoding": "gzip", **(headers or {})}
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    proxy = _proxy_for(parts.scheme, parts.netloc)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    if proxy is not None and parts.scheme == "http":
+        # Plain HTTP through a proxy uses the absolute URL as the request target.
+        path = urllib.parse.urlunsplit((parts.scheme, parts.netloc, path, "", ""))
+        headers.update(_proxy_auth_headers(proxy))
+
+    with _IDLE_LOCK:
+        idle = _IDLE_CONNS.get(key)
+        conn = idle.pop() if idle else None
+    reused = conn is not None
+    if conn is None:
+        conn = _new_conn(parts.scheme, parts.netloc, timeout, proxy)
+
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+    except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+        conn.close()
+        if not reused:
+            raise
+        # The server dropped an idle keep-alive connection; retry once on a fresh one.
+        conn = _new_conn(parts.scheme, parts.netloc, timeout, proxy)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+    except Exception:
+        conn.close()
+        raise
+
+    if resp.will_close:
+        conn.close()
+    else:
+        with _IDLE_LOCK:
+            _IDLE_CONNS.setdefault(key, []).append(conn)
+    if data and (resp.getheader("Content-Encoding") or "").strip().lower() == "gzip":
+        # BadGzipFile is an OSError; re-raise as ValueError so it isn't retried as a network error.
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError, zlib.error) as e:
+            raise ValueError(f"invalid gzip response body (HTTP {resp.status} from {parts.netloc}): {e}") from e
+    return resp.status, resp.headers, data
+
+
+# Connection drops mid-request; anything else (TLS/certificate errors, refused
+# connections, DNS failures, timeouts) is not going to fix itself on a retry.
+_HTTP_RETRY_ERRORS = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, http.client.HTTPException)
+
+
+def _retry_delay(attempt: int, headers: Optional[http.client.HTTPMessage]) -> float:
+    retry_after = (headers.get("Retry-After") or "").strip() if headers is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), HTTP_RETRY_MAX_DELAY_S)
+    return HTTP_RETRY_BACKOFF_S * (2**attempt)
+
+
+def _http_call(
+    method: str,
+    url: str,
+    body: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 60,
+) -> Tuple[int, http.client.HTTPMessage, bytes]:
+    """
+    Performs a request over a pooled keep-alive connection and returns (status, headers, body).
+    HTTP(S)_PROXY / NO_PROXY are honoured and GET redirects are followed, like urllib does.
+    Transient failures (429/5xx, dropped connections) are retried with exponential backoff;
+    once retries are exhausted the last response is returned or the last error re-raised.
+    Timeouts, refused connections, DNS and TLS errors are raised immediately.
+    """
+    attempt = 0
+    redirects = 0
+    while True:
+        try:
+            status, resp_headers, data = _http_call_once(method, url, body, headers, timeout)
+        except _HTTP_RETRY_ERRORS:
+            if attempt >= HTTP_RETRIES:
+                raise
+            time.sleep(_retry_delay(attempt, None))
+        else:
+            location = resp_headers.get("Location")
+            if method == "GET" and status in HTTP_REDIRECT_STATUSES and location and redirects < HTTP_MAX_REDIRECTS:
+                next_url = urllib.parse.urljoin(url, location)
+                if urllib.parse.urlsplit(next_url).scheme in ("http", "https"):
+                    url = next_url
+                    redirects += 1
+                    attempt = 0
+                    continue
+            if status not in HTTP_RETRY_STATUSES or attempt >= HTTP_RETRIES:
+                return status, resp_headers, data
+            time.sleep(_retry_delay(attempt, resp_headers))
+        attempt += 1
+
+
 def _request(api_key: str, payload: dict) -> dict:
     body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        OPENROUTER_URL,
-        data=body,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read().decode("utf-8")
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8", errors="replace") if hasattr(e, "read") else str(e)
-        _die(f"OpenRouter HTTP error: {e.code}\n{raw}")
+        status, _, data = _http_call(
+            "POST",
+            OPENROUTER_URL,
+            body=body,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+        )
     except Exception as e:
         _die(f"OpenRouter request failed: {e}")
+    if status >= 400:
+        _die(f"OpenRouter HTTP error: {status}\n{data.decode('utf-8', errors='replace')}")
     try:
-        return json.loads(raw)
+        return _json_loads(data)
     except json.JSONDecodeError:
-        _die(f"OpenRouter returned non-JSON response:\n{raw}")
+        _die(f"OpenRouter returned non-JSON response:\n{data.decode('utf-8', errors='replace')}")
+
+
+def _github_cache_path(url: str) -> Path:
+    base = Path(os.environ.get("XDG_CACHE_HOME") or "~/.cache").expanduser()
+    return base / "magda" / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _store_github_cache(cache_path: Path, data: bytes, etag: Optional[str]) -> None:
+    # Concurrent runs (e.g. shell loops) may read while we write: replace both files
+    # atomically, body first. A sidecar must never describe a body we didn't store,
+    # otherwise every revalidation would get a 304 and pin the stale body.
+    etag_path = cache_path.with_suffix(".etag")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(cache_path, data)
+    except OSError:
+        try:
+            etag_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return
+    try:
+        if etag:
+            _atomic_write(etag_path, etag.encode("utf-8"))
+        else:
+            etag_path.unlink(missing_ok=True)
+    except OSError:
+        pass
 
 
 def _http_get_json(url: str, headers: Optional[Dict[str, str]] = None) -> Union[Dict[str, Any], List[Any]]:
-    req = urllib.request.Request(url, headers=headers or {}, method="GET")
+    headers = dict(headers or {})
+    # GitHub's unauthenticated API is rate limited; keep a short-lived disk cache
+    # and revalidate it with ETag (304 responses don't count against the limit).
+    cache_path = _github_cache_path(url) if url.startswith(GITHUB_API_PREFIX) else None
+    cached: Optional[bytes] = None
+    if cache_path is not None:
+        try:
+            cached = cache_path.read_bytes()
+            if time.time() - cache_path.stat().st_mtime < GITHUB_CACHE_TTL_S:
+                return _json_loads(cached)
+            headers["If-None-Match"] = cache_path.with_suffix(".etag").read_text(encoding="utf-8").strip()
+        except (OSError, ValueError):
+            pass
+
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read().decode("utf-8")
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8", errors="replace") if hasattr(e, "read") else str(e)
-        _die(f"HTTP error: {e.code}\n{raw}")
+        status, resp_headers, data = _http_call("GET", url, headers=headers)
     except Exception as e:
         _die(f"HTTP request failed: {e}")
 
+    if status == 304 and cache_path is not None and cached is not None:
+        try:
+            obj = _json_loads(cached)
+        except ValueError:
+            # Cached body is unreadable; fall back to an unconditional fetch.
+            headers.pop("If-None-Match", None)
+            try:
+                status, resp_headers, data = _http_call("GET", url, headers=headers)
+            except Exception as e:
+                _die(f"HTTP request failed: {e}")
+        else:
+            try:
+                os.utime(cache_path)
+            except OSError:
+                pass
+            return obj
+
+    if status >= 400:
+        _die(f"HTTP error: {status}\n{data.decode('utf-8', errors='replace')}")
+
     try:
-        return json.loads(raw)
+        obj = _json_loads(data)
     except json.JSONDecodeError:
-        _die(f"Non-JSON response:\n{raw}")
+        _die(f"Non-JSON response:\n{data.decode('utf-8', errors='replace')}")
+
+    if cache_path is not None:
+        _store_github_cache(cache_path, data, resp_headers.get("ETag"))
+    return obj
 
 
 def _extract_codex_cli_range(query: str) -> Optional[Tuple[int, int]]:
@@ -66,29 +362,24 @@ def _extract_codex_cli_range(query: str) -> Optional[Tuple[int, int]]:
     - 0.80-0.87 / 0.80-87 / 0.80 do 0.87
     - also supports a single version like 0.87
     """
-    minors = [int(m.group(1)) for m in re.finditer(r"0\.(\d{2})(?:\.\d+)?", query)]
+    if "0." not in query:
+        return None
+    minors = [int(m.group(1)) for m in _CODEX_VER_RE.finditer(query)]
     if not minors:
         return None
     return (min(minors), max(minors))
 
 
 def _summarize_bullets_from_markdown(body: str, limit: int = 8) -> List[str]:
-    bullets: List[str] = []
-    for line in body.splitlines():
-        s = line.strip()
-        if not s:
-            continue
-        if s.startswith(("-", "*")):
-            item = s.lstrip("-*").strip()
-            if item:
-                bullets.append(item)
-                if len(bullets) >= limit:
-                    break
-    return bullets
+    # Normalize to "\n" so every str.splitlines() boundary (\r, \u2028, ...) is a line end.
+    return _BULLET_RE.findall("\n".join(body.splitlines()))[:limit]
 
 
-def _maybe_codex_cli_changelog_tldr(query: str, lang: str) -> Optional[str]:
-    q = query.lower()
+# Pure for a given (query, lang) within a process, so wrappers that call it in a
+# loop don't refetch and reformat the releases list.
+@functools.lru_cache(maxsize=32)
+def _maybe_codex_cli_changelog_tldr(query: str, lang: str, query_lower: Optional[str] = None) -> Optional[str]:
+    q = query_lower if query_lower is not None else query.lower()
     if "codex" not in q or "cli" not in q:
         return None
 
@@ -114,8 +405,8 @@ def _maybe_codex_cli_changelog_tldr(query: str, lang: str) -> Optional[str]:
     for r in data:
         if not isinstance(r, dict):
             continue
-        tag = str(r.get("tag_name") or "")
-        m = re.fullmatch(r"rust-v0\.(\d{2})\.0", tag)
+        tag = r.get("tag_name")
+        m = _RUST_TAG_RE.fullmatch(tag) if isinstance(tag, str) else None
         if not m:
             continue
         minor = int(m.group(1))
@@ -127,106 +418,67 @@ def _maybe_codex_cli_changelog_tldr(query: str, lang: str) -> Optional[str]:
 
     missing = [m for m in range(min_minor, max_minor + 1) if m not in releases]
 
-    lines: List[str] = []
-    lines.append(f"TL;DR: Codex CLI 0.{min_minor:02d}.0 → 0.{max_minor:02d}.0")
-    lines.append("")
-
-    for minor in sorted(releases):
-        r = releases[minor]
-        url = str(r.get("html_url") or f"https://github.com/openai/codex/releases/tag/rust-v0.{minor:02d}.0")
-        published = (str(r.get("published_at") or "").split("T")[0]) or "—"
+    minors = sorted(releases)
+    urls: Dict[int, str] = {}
+    lines: List[str] = [f"TL;DR: Codex CLI 0.{min_minor:02d}.0 → 0.{max_minor:02d}.0", ""]
+    for minor in minors:
+        get = releases[minor].get
+        urls[minor] = str(get("html_url") or f"https://github.com/openai/codex/releases/tag/rust-v0.{minor:02d}.0")
+        published = (str(get("published_at") or "").split("T")[0]) or "—"
         lines.append(f"0.{minor:02d}.0 ({published}):")
-        body = str(r.get("body") or "").strip()
+        body = str(get("body") or "").strip()
         bullets = _summarize_bullets_from_markdown(body, limit=8)
         if bullets:
-            for b in bullets:
-                lines.append(f"- {b}")
+            lines.extend(f"- {b}" for b in bullets)
         else:
             lines.append("- (brak szczegółów w opisie release)")
-        lines.append(f"  Źródło: {url}")
-        lines.append("")
+        lines.extend((f"  Źródło: {urls[minor]}", ""))
 
     if missing:
-        lines.append("Brak stabilnych wydań w tym zakresie dla: " + ", ".join(f"0.{m:02d}.0" for m in missing))
-        lines.append("")
-
-    lines.append("Źródła:")
-    lines.append("- https://github.com/openai/codex/releases")
-    for minor in sorted(releases):
-        url = str(
-            releases[minor].get("html_url")
-            or f"https://github.com/openai/codex/releases/tag/rust-v0.{minor:02d}.0"
-        )
-        lines.append(f"- {url}")
+        lines.extend(("Brak stabilnych wydań w tym zakresie dla: " + ", ".join(f"0.{m:02d}.0" for m in missing), ""))
+
+    lines.extend(("Źródła:", "- https://github.com/openai/codex/releases"))
+    lines.extend(f"- {urls[minor]}" for minor in minors)
 
     if lang != "pl":
-        lines.append("")
-        lines.append(f"(Uwaga: lang={lang}; tryb TL;DR obecnie wypisuje po polsku.)")
+        lines.extend(("", f"(Uwaga: lang={lang}; tryb TL;DR obecnie wypisuje po polsku.)"))
 
     return "\n".join(lines).rstrip() + "\n"
 
 
 def _classify_query(query: str) -> str:
     q = query.strip().lower()
-    words = [w for w in re.split(r"\s+", q) if w]
-    if len(words) <= 6:
+    n_words = len(q.split())
+    if n_words <= 6:
         return "banal"
 
-    complexity_markers = [
-        "porówn",
-        "różnic",
-        "wady",
-        "zalety",
-        "dlaczego",
-        "jak zrobić",
-        "krok po kroku",
-        "strategi",
-        "plan",
-        "analiz",
-        "relacj",
-        "histori",
-        "tło",
-        "konsekwenc",
-        "wpływ",
-        "kontrowers",
-        "zależy",
-    ]
-    if any(m in q for m in complexity_markers):
+    if _COMPLEXITY_RE.search(q):
         return "complex"
 
-    if len(words) >= 12:
+    if n_words >= 12:
         return "complex"
 
     return "banal"
 
 
 def _explicit_depth_intent(query: str) -> Optional[str]:
-    q = query.lower()
-    if any(k in q for k in ["3 razy", "trzy razy", "iterac", "seria wyszuka", "zgłębia", "głębok", "deep"]):
+    q = query.casefold()
+    if _DEEP_INTENT_RE.search(q):
         return "deep"
-    if any(k in q for k in ["proste", "szybko", "jedno wyszuk", "jednoraz", "basic"]):
+    if _SIMPLE_INTENT_RE.search(q):
         return "simple"
     return None
 
 
 def _extract_first_json_object(text: str) -> Optional[Dict[str, Any]]:
     start = text.find("{")
-    if start < 0:
-        return None
-    depth = 0
-    for i in range(start, len(text)):
-        c = text[i]
-        if c == "{":
-            depth += 1
-        elif c == "}":
-            depth -= 1
-            if depth == 0:
-                chunk = text[start : i + 1]
-                try:
-                    obj = json.loads(chunk)
-                except Exception:
-                    return None
-                return obj if isinstance(obj, dict) else None
+    while start >= 0:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            start = text.find("{", start + 1)
+            continue
+        return obj if isinstance(obj, dict) else None
     return None
 
 
@@ -290,29 +542,72 @@ def _openrouter_web_search_json_plan(api_key: str, model: str, query: str, lang:
     return obj
 
 
-def _deep_search_3x(api_key: str, model: str, query: str, lang: str, max_results: int) -> str:
+def _canonical_url(url: str) -> str:
+    try:
+        p = urllib.parse.urlsplit(url)
+    except ValueError:
+        return url
+    query = "&".join(kv for kv in p.query.split("&") if kv and not kv.startswith(_TRACKING_PARAM_PREFIXES))
+    return urllib.parse.urlunsplit((p.scheme.lower(), p.netloc.lower(), p.path.rstrip("/") or "/", query, ""))
+
+
+def _deep_search_3x(
+    api_key: str, model: str, query: str, lang: str, max_results: int, synthesize: bool = True
+) -> str:
     step1 = _openrouter_web_search_json_plan(api_key, model, query, lang, max_results)
     followups = step1.get("followup_queries") or []
     q2 = str(followups[0]) if len(followups) >= 1 else f"{query} szczegóły"
     q3 = str(followups[1]) if len(followups) >= 2 else f"{query} kontekst i źródła"
 
-    step2 = _openrouter_web_search_json_plan(api_key, model, q2, lang, max_results)
-    step3 = _openrouter_web_search_json_plan(api_key, model, q3, lang, max_results)
+    # Steps 2 and 3 only depend on step 1, so run them concurrently.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as ex:
+        f2 = ex.submit(_openrouter_web_search_json_plan, api_key, model, q2, lang, max_results)
+        f3 = ex.submit(_openrouter_web_search_json_plan, api_key, model, q3, lang, max_results)
+        step2, step3 = f2.result(), f3.result()
 
-    sources: List[Dict[str, str]] = []
-    seen_urls: set[str] = set()
+    # Keyed by canonical URL so trailing slashes, fragments and tracking params
+    # don't produce duplicate citations; the first occurrence wins.
+    by_url: Dict[str, Dict[str, str]] = {}
+    step_urls: List[List[str]] = []
     for step in (step1, step2, step3):
+        keys: List[str] = []
         for s in step.get("sources") or []:
             if not isinstance(s, dict):
                 continue
-            url = str(s.get("url") or "").strip()
-            title = str(s.get("title") or "").strip()
-            if not url or url in seen_urls:
+            get = s.get
+            url = str(get("url") or "").strip()
+            if not url:
                 continue
-            seen_urls.add(url)
-            sources.append({"title": title or url, "url": url})
+            title = str(get("title") or "").strip()
+            key = _canonical_url(url)
+            by_url.setdefault(key, {"title": title or url, "url": url})
+            keys.append(key)
+        step_urls.append(keys)
+    sources = list(by_url.values())
 
     numbered_sources = "\n".join([f"[{i+1}] {s['title']} — {s['url']}" for i, s in enumerate(sources[:12])])
+
+    if not synthesize:
+        # Render the iterations directly when they already carry enough material,
+        # saving the final inference round trip. Each bullet cites the sources
+        # found by the same search pass.
+        numbers = {key: i + 1 for i, key in enumerate(list(by_url)[:12])}
+        bullets: Dict[str, str] = {}
+        for step, keys in zip((step1, step2, step3), step_urls):
+            cited = list(dict.fromkeys(numbers[k] for k in keys if k in numbers))[:3]
+            refs = "".join(f"[{n}]" for n in cited)
+            # Model output is unvalidated: a string here would iterate per character.
+            step_bullets = step.get("tldr_bullets")
+            if not isinstance(step_bullets, list):
+                continue
+            for b in step_bullets:
+                text = b.strip() if isinstance(b, str) else ""
+                if text:
+                    bullets.setdefault(text, refs)
+        if len(bullets) >= 6 and len(sources) >= 3:
+            tldr = "\n".join(f"- {b} {refs}".rstrip() for b, refs in list(bullets.items())[:12])
+            return f"TL;DR:\n{tldr}\n\nŹródła:\n{numbered_sources}\n"
+
     synthesis_prompt = (
         f"Zsyntetyzuj odpowiedź na pytanie użytkownika: {query}\n\n"
         f"Masz wyniki trzech iteracji researchu (poniżej). Zrób finalny skrót:\n"
@@ -320,9 +615,9 @@ def _deep_search_3x(api_key: str, model: str, query: str, lang: str, max_results
         f"- 6–12 punktów\n"
         f"- cytowania w tekście w formacie [n] odnoszące się do listy 'Źródła' poniżej\n"
         f"- jeśli są rozbieżności, pokaż 2–3 warianty i oznacz cytowaniami\n\n"
-        f"Iteracja 1 (JSON): {json.dumps(step1, ensure_ascii=False)}\n\n"
-        f"Iteracja 2 (JSON): {json.dumps(step2, ensure_ascii=False)}\n\n"
-        f"Iteracja 3 (JSON): {json.dumps(step3, ensure_ascii=False)}\n\n"
+        f"Iteracja 1 (JSON): {_json_dumps(step1)}\n\n"
+        f"Iteracja 2 (JSON): {_json_dumps(step2)}\n\n"
+        f"Iteracja 3 (JSON): {_json_dumps(step3)}\n\n"
         f"Źródła:\n{numbered_sources}\n"
     )
     payload = {
@@ -364,15 +659,25 @@ def main() -> None:
         default="auto",
         help="Search strategy: auto (default), simple (1 pass), deep (3 passes).",
     )
+    parser.add_argument(
+        "--no-synthesis",
+        action="store_true",
+        help=(
+            "Deep mode only: skip the final synthesis call when the 3 passes "
+            "already gave enough bullets and sources."
+        ),
+    )
     args = parser.parse_args()
 
     if args.max_results < 1 or args.max_results > 20:
         _die("--max-results must be between 1 and 20")
 
-    codex_tldr = _maybe_codex_cli_changelog_tldr(args.query, args.lang)
-    if codex_tldr:
-        print(codex_tldr)
-        return
+    ql = args.query.lower()
+    if "codex" in ql and "cli" in ql:
+        codex_tldr = _maybe_codex_cli_changelog_tldr(args.query, args.lang, ql)
+        if codex_tldr:
+            print(codex_tldr)
+            return
 
     api_key = os.environ.get("OPENROUTER_API_KEY")
     if not api_key:
@@ -393,8 +698,20 @@ def main() -> None:
         else:
             mode = "simple"
 
+    if args.no_synthesis and mode != "deep":
+        print("Uwaga: --no-synthesis działa tylko w trybie deep; ignoruję.", file=sys.stderr)
+
     if mode == "deep":
-        print(_deep_search_3x(api_key, args.model, args.query, args.lang, args.max_results))
+        print(
+            _deep_search_3x(
+                api_key,
+                args.model,
+                args.query,
+                args.lang,
+                args.max_results,
+                synthesize=not args.no_synthesis,
+            )
+        )
         return
 
     # simple